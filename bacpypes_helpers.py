@@ -1,169 +1,343 @@
+import atexit
+import collections
+import functools
 import sys
 import threading
 
-from bacpypes.apdu import ReadPropertyRequest, APDU, ReadPropertyMultipleRequest, SubscribeCOVRequest, SimpleAckPDU
+from bacpypes.apdu import ReadPropertyRequest, APDU, ReadPropertyMultipleRequest, SubscribeCOVRequest, SimpleAckPDU, \
+    ReadAccessSpecification
+from bacpypes.basetypes import PropertyReference
 from bacpypes.errors import ExecutionError
 from bacpypes.object import get_datatype
 from bacpypes.iocb import IOCB
 
 from bacpypes.core import deferred, run, stop
 from bacpypes.pdu import Address
+from bacpypes.task import FunctionTask
 
 from bacpypes.app import BIPSimpleApplication
 from bacpypes.local.device import LocalDeviceObject
 import concurrent.futures
-from typing import Callable, Tuple, Any
+from typing import Callable, Tuple, Any, Dict, Iterable, List, Optional, Union
 import logging
 import time
 
-FORMATTER = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+# raw record timestamp, avoids a strftime call per record
+FORMATTER = logging.Formatter("%(created).3f - %(name)s - %(levelname)s - %(message)s")
 
 LOGGER = None
 
+_LOCAL_DEVICE = None
+
+# datatypes are fixed per (object type, property identifier), no need to walk the registry on every read
+_get_datatype_cached = functools.lru_cache(maxsize=1024)(get_datatype)
+
+_CLIENT = None
+_CLIENT_LOCK = threading.Lock()
+
 
 def setup_logger() -> logging.Logger:
     global LOGGER
     if LOGGER:
         return LOGGER
 
-    console_handler = logging.StreamHandler(sys.stdout)
-    console_handler.setFormatter(FORMATTER)
+    logger = logging.getLogger("BACnetClient")
+    logger.setLevel(logging.INFO)
+    # the logger is process wide, don't stack another handler on it if one is already attached
+    if not logger.handlers:
+        console_handler = logging.StreamHandler(sys.stdout)
+        console_handler.setFormatter(FORMATTER)
+        logger.addHandler(console_handler)
 
-    LOGGER = logging.getLogger("BACnetClient")
-    LOGGER.setLevel(logging.DEBUG)
-    LOGGER.addHandler(console_handler)
+    LOGGER = logger
     return LOGGER
 
 
-class IocbHelper(object):
-    def __init__(self, iocb: IOCB, request_io: Callable[[IOCB], Any]):
-        self._iocb = iocb
-        self._request_io = request_io
+def _new_local_device() -> LocalDeviceObject:
+    return LocalDeviceObject(
+        objectName="BACpypes Client",
+        objectIdentifier=("device", 1),
+        maxApduLengthAccepted=1024,
+        segmentationSupported="segmentedBoth",
+        vendorIdentifier=15,
+    )
 
-    def __enter__(self):
-        deferred(self._request_io, self._iocb)
-        self._iocb.wait()
 
-    def __exit__(self, exc_type, exc_val, exc_tb):
-        deferred(stop)
+def _get_local_device() -> LocalDeviceObject:
+    # the device of the shared BACnetClient; an application points the device's _app at itself,
+    # so every other application gets its own device from _new_local_device()
+    global _LOCAL_DEVICE
+    if _LOCAL_DEVICE:
+        return _LOCAL_DEVICE
+
+    _LOCAL_DEVICE = _new_local_device()
+    return _LOCAL_DEVICE
+
+
+class BACnetRequestError(Exception):
+    def __init__(self, error: Any):
+        super(BACnetRequestError, self).__init__(str(error))
+        # the original Error/Reject/Abort APDU or exception taken from iocb.ioError
+        self.error = error
+        self.error_class = getattr(error, "errorClass", None)
+        self.error_code = getattr(error, "errorCode", None)
+        if isinstance(error, BaseException):
+            self.__cause__ = error
 
 
 # Define the BACnet client application
 class BACnetClient(BIPSimpleApplication):
-    def __init__(self, local_address: Address):
+    def __init__(self, local_address: Address, local_device: Optional[LocalDeviceObject] = None):
         self._logger = setup_logger()
-        super(BACnetClient, self).__init__(LocalDeviceObject(
-            objectName="BACpypes Client",
-            objectIdentifier=("device", 1),
-            maxApduLengthAccepted=1024,
-            segmentationSupported="segmentedBoth",
-            vendorIdentifier=15,
-        ), local_address)
-
-    def _init_iocb(self, iocb: IOCB, successful_callback: Callable[[APDU], Any]) -> Any:
-        with IocbHelper(iocb, self.request_io):
-            if iocb.ioError:
-                # do something for success
-                self._logger.error(str(iocb.ioError))
-            elif iocb.ioResponse:
-                return successful_callback(iocb.ioResponse)
-            else:
-                self._logger.error("something wrong")
-            return None
-
-    def _do_read_property(self, read_property_request: ReadPropertyRequest, property_identifier: str):
-        def callback(apdu: APDU) -> Any:
-            datatype = get_datatype(apdu.objectIdentifier[0], property_identifier)
-            self._logger.debug("Data Type: " + str(datatype))
-            if not datatype:
-                raise TypeError("unknown datatype")
+        super(BACnetClient, self).__init__(local_device or _get_local_device(), local_address)
+        self._core_thread = None
 
-            # special case for array parts, others are managed by cast_out
-            value = apdu.propertyValue.cast_out(datatype)
-            self._logger.debug("Value: " + str(value))
-            return value
-
-        return self._init_iocb(IOCB(read_property_request), callback)
+    def start(self):
+        if self._core_thread:
+            return
 
-    def _do_read_property_multiple(self, read_property_multiple_request: ReadPropertyMultipleRequest):
-        def callback(apdu: APDU) -> Any:
-            return None
+        # the core loop services all I/O in the background, callers just wait on their IOCBs;
+        # deferred functions run on the first pass of the loop, so this returns once it is up
+        running = threading.Event()
+        deferred(running.set)
+        # signal handlers can only be installed from the main thread
+        self._core_thread = threading.Thread(target=run, name="bacpypes-core", daemon=True,
+                                             kwargs={"sigterm": None, "sigusr1": None})
+        self._core_thread.start()
+        running.wait()
+
+    def stop(self):
+        if not self._core_thread:
+            return
 
-        return self._init_iocb(IOCB(read_property_multiple_request), callback)
+        deferred(stop)
+        self._core_thread.join()
+        self._core_thread = None
+
+    def _parse_read_property(self, apdu: APDU, property_identifier: str) -> Any:
+        datatype = _get_datatype_cached(apdu.objectIdentifier[0], property_identifier)
+        self._logger.debug("Data Type: %s", datatype)
+        if not datatype:
+            raise TypeError("unknown datatype")
+
+        # special case for array parts, others are managed by cast_out
+        value = apdu.propertyValue.cast_out(datatype)
+        self._logger.debug("Value: %s", value)
+        return value
+
+    def _parse_read_property_multiple(self, apdu: APDU) -> Dict[Tuple[str, int, str], Any]:
+        values = {}
+        for result in apdu.listOfReadAccessResults:
+            object_type, instance = result.objectIdentifier
+            for element in result.listOfResults:
+                # one failing property doesn't fail the whole request, it is just left out
+                access_error = element.readResult.propertyAccessError
+                if access_error:
+                    self._logger.error("%s:%s %s: %s %s", object_type, instance, element.propertyIdentifier,
+                                       access_error.errorClass, access_error.errorCode)
+                    continue
+
+                datatype = _get_datatype_cached(object_type, element.propertyIdentifier)
+                if not datatype:
+                    raise TypeError("unknown datatype")
+
+                value = element.readResult.propertyValue.cast_out(datatype)
+                values[(object_type, instance, element.propertyIdentifier)] = value
+        self._logger.debug("Values: %s", values)
+        return values
+
+    def submit_read(self, request: APDU, parse: Optional[Callable[[APDU], Any]] = None) -> concurrent.futures.Future:
+        # hand the request to the core thread and return right away, the future
+        # is completed from the IOCB callback once the response (or error) arrives
+        future = concurrent.futures.Future()
+
+        def callback(iocb: IOCB):
+            if iocb.ioResponse:
+                try:
+                    future.set_result(parse(iocb.ioResponse) if parse else iocb.ioResponse)
+                except Exception as e:
+                    future.set_exception(e)
+            else:
+                future.set_exception(BACnetRequestError(iocb.ioError))
 
-    def make_request_read_property(self, device_address: Address, object_identifier: Tuple[str, int],
-                                   property_identifier: str):
+        iocb = IOCB(request)
+        iocb.add_callback(callback)
+        deferred(self.request_io, iocb)
+        return future
+
+    @staticmethod
+    def gather(futures: List[concurrent.futures.Future], timeout: Optional[float] = None) -> List[Any]:
+        # results come back in submission order, whatever order the responses arrived in
+        _, not_done = concurrent.futures.wait(futures, timeout=timeout)
+        if not_done:
+            raise concurrent.futures.TimeoutError("{} of {} requests did not complete".format(
+                len(not_done), len(futures)))
+        return [future.result() for future in futures]
+
+    @staticmethod
+    def _build_read_property_request(device_address: Address, object_identifier: Tuple[str, int],
+                                     property_identifier: str) -> ReadPropertyRequest:
         # Create a BACnet ReadPropertyRequest
         request = ReadPropertyRequest(
             objectIdentifier=object_identifier,
             propertyIdentifier=property_identifier,
         )
         request.pduDestination = device_address
+        return request
 
-        with concurrent.futures.ThreadPoolExecutor() as executor:
-            future = executor.submit(self._do_read_property, request, property_identifier)
-            run()
-            return future.result()
+    def make_request_read_property(self, device_address: Address, object_identifier: Tuple[str, int],
+                                   property_identifier: str):
+        # the core thread services the I/O while this thread waits on the future
+        return self.make_request_read_property_async(device_address, object_identifier, property_identifier).result()
+
+    def make_request_read_property_async(self, device_address: Address, object_identifier: Tuple[str, int],
+                                         property_identifier: str) -> concurrent.futures.Future:
+        request = self._build_read_property_request(device_address, object_identifier, property_identifier)
+        return self.submit_read(request, functools.partial(self._parse_read_property,
+                                                           property_identifier=property_identifier))
+
+    @staticmethod
+    def _build_read_property_multiple_request(device_address: Address, items: Iterable[Tuple[str, int, str]]) \
+            -> ReadPropertyMultipleRequest:
+        # group the properties per object, one ReadAccessSpecification each
+        property_references = {}
+        for object_type, object_identifier, property_identifier in items:
+            property_references.setdefault((object_type, object_identifier), []).append(
+                PropertyReference(propertyIdentifier=property_identifier))
 
-    def make_request_read_property_multiple(self, device_address: Address):
         # Create a BACnet ReadPropertyMultipleRequest
-        request = ReadPropertyMultipleRequest()
+        request = ReadPropertyMultipleRequest(listOfReadAccessSpecs=[
+            ReadAccessSpecification(objectIdentifier=object_identifier, listOfPropertyReferences=references)
+            for object_identifier, references in property_references.items()
+        ])
         request.pduDestination = device_address
+        return request
 
-        with concurrent.futures.ThreadPoolExecutor() as executor:
-            future = executor.submit(self._do_read_property, request)
-            run()
-            return future.result()
+    def make_request_read_property_multiple(self, device_address: Address,
+                                            items: Iterable[Tuple[str, int, str]]) -> Dict[Tuple[str, int, str], Any]:
+        return self.make_request_read_property_multiple_async(device_address, items).result()
+
+    def make_request_read_property_multiple_async(self, device_address: Address,
+                                                  items: Iterable[Tuple[str, int, str]]) -> concurrent.futures.Future:
+        request = self._build_read_property_multiple_request(device_address, items)
+        return self.submit_read(request, self._parse_read_property_multiple)
 
 
 class SubscriptionContext:
-    def __init__(self, address: Address, objid, subscription_context: dict, property_identifier: str,
-                 confirmed: bool = False, lifetime: int = 20, proc_id: int = 1000):
+    __slots__ = ("address", "_wanted", "_single", "subscriberProcessIdentifier",
+                 "monitoredObjectIdentifier", "issueConfirmedNotifications", "lifetime", "_logger", "_max_samples",
+                 "_value_list", "_lock", "_flush_interval", "_pending", "_flush_task")
+
+    def __init__(self, address: Address, objid, property_identifier: Union[str, Iterable[str]],
+                 confirmed: bool = False, lifetime: int = 20, proc_id: int = 1000, max_samples: int = 100_000,
+                 flush_interval: float = 0.0):
         # destination for subscription requests
         self.address = address
 
-        # assign a unique process identifer and keep track of it
-        self._subscription_context = subscription_context
-        self._property_identifier = property_identifier
+        self._wanted = frozenset((property_identifier,) if isinstance(property_identifier, str)
+                                 else property_identifier)
+        # with exactly one property there is nothing to tell apart, values are stored bare;
+        # with several, each value is stored as a (property identifier, value) pair
+        self._single = next(iter(self._wanted)) if len(self._wanted) == 1 else None
+        # the application indexes the context by this and the address once it is subscribed
         self.subscriberProcessIdentifier = proc_id
-        self._subscription_context[self.subscriberProcessIdentifier] = self
 
         self.monitoredObjectIdentifier = objid
         self.issueConfirmedNotifications = confirmed
         self.lifetime = lifetime
         self._logger = setup_logger()
-        self._value_list = []
+        # keep only the most recent samples so long subscriptions don't grow without bound
+        self._max_samples = max_samples
+        self._value_list = collections.deque(maxlen=self._max_samples)
+        # notifications are handled on the core thread, values is read from the caller's
+        self._lock = threading.Lock()
+
+        # with a flush interval, notifications are queued raw and processed in batches by a
+        # task the core loop runs, so no thread is started per flush window
+        self._flush_interval = flush_interval
+        self._pending = collections.deque()
+        self._flush_task = FunctionTask(self._flush)
 
     def cov_notification(self, apdu):
-        self._logger.debug("{} {} changed\n    {}".format(
-            apdu.pduSource,
-            apdu.monitoredObjectIdentifier,
-            ",\n    ".join("{} = {}".format(
-                element.propertyIdentifier,
-                str(element.value.tagList[0].app_to_object().value),
-            ) for element in apdu.listOfValues),
-        ))
-        for element in apdu.listOfValues:
-            if element.propertyIdentifier != self._property_identifier:
-                continue
-            self._value_list.append(str(element.value.tagList[0].app_to_object().value))
+        if self._flush_interval:
+            self._pending.append((apdu.pduSource, apdu.monitoredObjectIdentifier, tuple(
+                (element.propertyIdentifier, element.value.tagList[0].app_to_object().value)
+                for element in apdu.listOfValues)))
+            if not self._flush_task.isScheduled:
+                self._flush_task.install_task(delta=self._flush_interval)
+            return
+
+        if self._logger.isEnabledFor(logging.DEBUG):
+            self._logger.debug("%s %s changed\n    %s",
+                               apdu.pduSource,
+                               apdu.monitoredObjectIdentifier,
+                               ",\n    ".join("{} = {}".format(
+                                   element.propertyIdentifier,
+                                   str(element.value.tagList[0].app_to_object().value),
+                               ) for element in apdu.listOfValues))
+        single = self._single
+        append = self._value_list.append
+        with self._lock:
+            if single:
+                for element in apdu.listOfValues:
+                    if element.propertyIdentifier == single:
+                        append(element.value.tagList[0].app_to_object().value)
+            else:
+                wanted = self._wanted
+                for element in apdu.listOfValues:
+                    if element.propertyIdentifier in wanted:
+                        append((element.propertyIdentifier, element.value.tagList[0].app_to_object().value))
+
+    def _flush(self):
+        with self._lock:
+            self._drain_pending()
+
+    def _drain_pending(self):
+        # callers hold self._lock
+        pending = self._pending
+        single = self._single
+        wanted = self._wanted
+        append = self._value_list.append
+        debug = self._logger.isEnabledFor(logging.DEBUG)
+        count = 0
+        while pending:
+            source, objid, values = pending.popleft()
+            count += 1
+            if debug:
+                self._logger.debug("%s %s changed\n    %s", source, objid,
+                                   ",\n    ".join("{} = {}".format(property_identifier, value)
+                                                  for property_identifier, value in values))
+            for property_identifier, value in values:
+                if single:
+                    if property_identifier == single:
+                        append(value)
+                elif property_identifier in wanted:
+                    append((property_identifier, value))
+        if count:
+            self._logger.debug("Flushed %d notifications", count)
 
     @property
-    def values(self):
-        return self._value_list
+    def values(self) -> List[Any]:
+        with self._lock:
+            self._drain_pending()
+            return list(self._value_list)
 
 
 class SubscribeCOVApplication(BIPSimpleApplication):
-    def __init__(self, subscription_context: dict, local_address: Address):
+    def __init__(self, local_address: Address, local_device: Optional[LocalDeviceObject] = None):
         self._logger = setup_logger()
-        self._subscription_context = subscription_context
-        super(SubscribeCOVApplication, self).__init__(LocalDeviceObject(
-            objectName="BACpypes Client",
-            objectIdentifier=("device", 1),
-            maxApduLengthAccepted=1024,
-            segmentationSupported="segmentedBoth",
-            vendorIdentifier=15,
-        ), local_address)
+        # (process identifier, address type, network, station) -> context, written and read only on the core thread
+        self._by_proc_and_src = {}
+        # notifications are only acked from the core thread, and the ack is encoded before
+        # response() returns, so one instance can be refilled for every notification
+        self._ack_template = SimpleAckPDU()
+        super(SubscribeCOVApplication, self).__init__(local_device or _new_local_device(), local_address)
+
+    @staticmethod
+    def _context_key(proc_id: int, address: Address) -> Tuple[int, int, Any, bytes]:
+        # the fields that identify the device; addrRoute is left out on purpose, it only
+        # describes the path a routed notification took, not who sent it
+        return proc_id, address.addrType, address.addrNet, address.addrAddr
 
     def send_subscription(self, context):
         # build a request
@@ -172,6 +346,7 @@ class SubscribeCOVApplication(BIPSimpleApplication):
             monitoredObjectIdentifier=context.monitoredObjectIdentifier,
         )
         request.pduDestination = context.address
+        self._by_proc_and_src[self._context_key(context.subscriberProcessIdentifier, context.address)] = context
 
         # optional parameters
         if context.issueConfirmedNotifications is not None:
@@ -203,9 +378,9 @@ class SubscribeCOVApplication(BIPSimpleApplication):
     def do_ConfirmedCOVNotificationRequest(self, apdu):
         self._logger.debug("do_ConfirmedCOVNotificationRequest %r", apdu)
 
-        # look up the process identifier
-        context = self._subscription_context.get(apdu.subscriberProcessIdentifier, None)
-        if not context or apdu.pduSource != context.address:
+        # look up the process identifier and source together
+        context = self._by_proc_and_src.get(self._context_key(apdu.subscriberProcessIdentifier, apdu.pduSource))
+        if not context:
             self._logger.debug("    - no context")
 
             # this is turned into an ErrorPDU and sent back to the client
@@ -214,8 +389,10 @@ class SubscribeCOVApplication(BIPSimpleApplication):
         # now tell the context object
         context.cov_notification(apdu)
 
-        # success
-        response = SimpleAckPDU(context=apdu)
+        # success, same fields SimpleAckPDU(context=apdu) fills in
+        response = self._ack_template
+        response.apduService = apdu.apduService
+        response.set_context(apdu)
         self._logger.debug("    - simple_ack: %r", response)
 
         # return the result
@@ -224,9 +401,9 @@ class SubscribeCOVApplication(BIPSimpleApplication):
     def do_UnconfirmedCOVNotificationRequest(self, apdu):
         self._logger.debug("do_UnconfirmedCOVNotificationRequest %r", apdu)
 
-        # look up the process identifier
-        context = self._subscription_context.get(apdu.subscriberProcessIdentifier, None)
-        if not context or apdu.pduSource != context.address:
+        # look up the process identifier and source together
+        context = self._by_proc_and_src.get(self._context_key(apdu.subscriberProcessIdentifier, apdu.pduSource))
+        if not context:
             self._logger.debug("    - no context")
             return
 
@@ -236,54 +413,145 @@ class SubscribeCOVApplication(BIPSimpleApplication):
 
 def run_bacpypes_for_x_seconds(x: int):
     logger = setup_logger()
-    start_time = time.time()
+    # hold the lock for the whole run so get_or_create_client() can't start the shared loop next
+    # to this one, the stop at the end would end both of them
+    with _CLIENT_LOCK:
+        if not _CLIENT:
+            # a single wakeup after x seconds instead of polling the clock every second
+            timer = threading.Timer(x, lambda: deferred(stop))
+            timer.daemon = True
+            timer.start()
+            logger.info("Started up Bacpypes")
+            run()
+            timer.cancel()
+            logger.info("Stopped up Bacpypes")
+            return
+
+    # the shared core loop is already servicing every application, don't start a second one
+    time.sleep(x)
+
+
+@functools.lru_cache(maxsize=4096)
+def _parse_addr(s: str) -> Address:
+    return Address(s)
+
+
+@functools.lru_cache(maxsize=64)
+def _parse_local_addr(s: str, port: int) -> Address:
+    return Address("{}/24:{}".format(s, port))
+
+
+def get_or_create_client(local_address: str) -> BACnetClient:
+    global _CLIENT
+    with _CLIENT_LOCK:
+        if not _CLIENT:
+            client = BACnetClient(_parse_local_addr(local_address, 47910), _get_local_device())
+            client.start()
+            _CLIENT = client
+        return _CLIENT
+
+
+def shutdown():
+    global _CLIENT
+    with _CLIENT_LOCK:
+        if not _CLIENT:
+            return
+
+        _CLIENT.stop()
+        _CLIENT = None
+
+
+atexit.register(shutdown)
 
-    def stop_after_x_seconds():
-        logger.debug("Starting the timeout thread")
-        while True:
-            if time.time() - start_time > (x + 1):
-                logger.debug("Stopping the Thread")
-                deferred(stop)
-                return
-            time.sleep(1)
 
-    thread = threading.Thread(target=stop_after_x_seconds)
-    thread.start()
-    logger.info("Started up Bacpypes")
-    run()
-    thread.join()
-    logger.info("Stopped up Bacpypes")
+def _call_on_core_thread(fn: Callable[..., Any], *args) -> Any:
+    # anything that binds to or tears down the stack has to happen on the shared loop's thread,
+    # otherwise the loop can pick up deferred startup work before bind() has finished;
+    # callers make sure the loop is up through get_or_create_client()
+    future = concurrent.futures.Future()
+
+    def call():
+        try:
+            future.set_result(fn(*args))
+        except BaseException as e:
+            future.set_exception(e)
+
+    deferred(call)
+    return future.result()
+
+
+def get_property_value_async(local_address: str, device_address: str, object_type: str, object_identifier: int,
+                             property_identifier: str) -> concurrent.futures.Future:
+    # Define the BACnet device information
+    device_address = _parse_addr(device_address)
+    object_identifier = (object_type, object_identifier)
+
+    client = get_or_create_client(local_address)
+    return client.make_request_read_property_async(device_address, object_identifier, property_identifier)
 
 
 def get_property_value(local_address: str, device_address: str, object_type: str, object_identifier: int,
                        property_identifier: str) -> Any:
+    return get_property_value_async(local_address, device_address, object_type, object_identifier,
+                                    property_identifier).result()
+
+
+def _normalize_items(items: Union[Iterable[Tuple[str, int, str]], Dict[Tuple[str, int], Iterable[str]]]) \
+        -> List[Tuple[str, int, str]]:
+    # accept either (object_type, object_identifier, property_identifier) tuples or a
+    # {(object_type, object_identifier): [property_identifier, ...]} mapping
+    if isinstance(items, dict):
+        return [(object_type, object_identifier, property_identifier)
+                for (object_type, object_identifier), properties in items.items()
+                for property_identifier in properties]
+    return list(items)
+
+
+def get_property_values(local_address: str, device_address: str,
+                        items: Union[Iterable[Tuple[str, int, str]], Dict[Tuple[str, int], Iterable[str]]],
+                        chunk_size: int = 7) -> Dict[Tuple[str, int, str], Any]:
     # Define the BACnet device information
-    device_address = Address(device_address)
-    local_address = Address("{}/24:47910".format(local_address))
-    object_identifier = (object_type, object_identifier)
+    device_address = _parse_addr(device_address)
+    items = _normalize_items(items)
+
+    # use chunk_size=1 for devices answering with segmentationNotSupported
+    client = get_or_create_client(local_address)
+    # submit every chunk before waiting on any of them
+    futures = [
+        client.make_request_read_property_multiple_async(device_address, items[i:i + chunk_size])
+        for i in range(0, len(items), chunk_size)
+    ]
 
-    client = BACnetClient(local_address)
-    return client.make_request_read_property(device_address, object_identifier, property_identifier)
+    values = {}
+    for chunk_values in client.gather(futures):
+        values.update(chunk_values)
+    return values
 
 
 def do_cov_subscription(local_address: str, device_address: str, object_type: str, object_identifier: int,
-                        property_identifier: str, confirmed: bool = False, duration: int = 20) -> list[str]:
+                        property_identifier: Union[str, Iterable[str]], confirmed: bool = False,
+                        duration: int = 20, max_samples: int = 100_000, flush_interval: float = 0.0) -> list[Any]:
+    # returns bare values for one property, (property identifier, value) pairs for several
     logger = setup_logger()
     # Define the BACnet device information
-    subscription_context = {}
-    device_address = Address(device_address)
-    local_address = Address("{}/24:47911".format(local_address))
+    device_address = _parse_addr(device_address)
+    cov_address = _parse_local_addr(local_address, 47911)
     object_identifier = (object_type, object_identifier)
 
+    # always run on the one shared loop, a second loop on this thread would share its global state
+    get_or_create_client(local_address)
     # initialize SubscribeCOVApplication
-    client = SubscribeCOVApplication(subscription_context, local_address)
+    client = _call_on_core_thread(SubscribeCOVApplication, cov_address)
     # initialize a subscription context
-    context = SubscriptionContext(device_address, object_identifier, subscription_context, property_identifier,
-                                  confirmed, duration)
+    context = SubscriptionContext(device_address, object_identifier, property_identifier, confirmed, duration,
+                                  max_samples=max_samples, flush_interval=flush_interval)
 
     logger.info("Running CoV Subscription")
     deferred(client.send_subscription, context)
-    run_bacpypes_for_x_seconds(duration)
+    # the shared loop delivers the notifications, this thread only has to wait
+    time.sleep(duration)
+    # release the port so the next subscription can bind it again
+    _call_on_core_thread(client.close_socket)
     logger.info("Finished CoV Subscription")
 
     return context.values
@@ -1,4 +1,7 @@
-from bacpypes_helpers import get_property_value, do_cov_subscription
+import concurrent.futures
+
+from bacpypes_helpers import BACnetRequestError, get_property_value, get_property_value_async, get_property_values, \
+    do_cov_subscription
 
 
 def simple_get_property_value():
@@ -6,14 +9,39 @@ def simple_get_property_value():
     print("Returned value: " + str(value))
 
 
+def concurrent_get_property_values():
+    object_identifiers = [1, 2, 3]
+    futures = {
+        get_property_value_async("192.168.0.165", "192.168.0.165", "analogValue", object_identifier,
+                                 "presentValue"): object_identifier
+        for object_identifier in object_identifiers
+    }
+    for future in concurrent.futures.as_completed(futures):
+        try:
+            print(f"Returned value from analogValue:{futures[future]}: {future.result()}")
+        except BACnetRequestError as e:
+            print(f"Reading analogValue:{futures[future]} failed: {e}")
+
+
+def batched_get_property_values():
+    values = get_property_values("192.168.0.165", "192.168.0.165", {
+        ("analogValue", 1): ["presentValue", "units", "statusFlags"],
+        ("analogValue", 2): ["presentValue", "units", "statusFlags"],
+    })
+    for (object_type, object_identifier, property_identifier), value in values.items():
+        print(f"Returned value: {object_type}:{object_identifier} {property_identifier} = {value}")
+
+
 def simple_unconfirmed_cov_request():
     values = do_cov_subscription("192.168.0.165", "192.168.0.165", "analogValue", 1, "presentValue")
-    list_of_values = ",".join(values)
+    list_of_values = ",".join(str(value) for value in values)
     print(f"Returned values: {list_of_values}, Total Number of Values: {len(values)}")
 
 
 def main():
     simple_get_property_value()
+    concurrent_get_property_values()
+    batched_get_property_values()
     simple_unconfirmed_cov_request()
 
 